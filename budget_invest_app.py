@@ -1,8 +1,18 @@
+import asyncio
+import hashlib
+import heapq
+import threading
+import time
+from typing import TYPE_CHECKING
+
 import streamlit as st
+import numpy as np
+import orjson
 import pandas as pd
-import plotly.express as px
-import requests
-from openai import OpenAI
+import httpx
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
 
 # =========================
 # 🔐 Secrets
@@ -14,69 +24,114 @@ OPENAI_API_KEY = st.secrets["openai"]["api_key"]
 OPENROUTER_API_KEY = st.secrets["openrouter"]["api_key"]
 API_KEY = st.secrets["alpha_vantage"]["api_key"]
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 # =========================
 # 📄 App config
 # =========================
 st.set_page_config(page_title="💸 Multi-LLM Budget Planner", layout="wide")
 st.title("💸 Budgeting + Investment Planner (Multi-LLM AI Suggestions)")
 
+# =========================
+# 🌐 Shared HTTP client
+# =========================
+@st.cache_resource(show_spinner=False)
+def get_http_client() -> httpx.Client:
+    # One pooled HTTP/2 client per server process so keep-alive / TLS sessions survive reruns.
+    transport = httpx.HTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+    )
+    return httpx.Client(transport=transport, timeout=30)
+
+HTTP = get_http_client()
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def _get_with_retry(url: str, retries: int = 2, backoff: float = 0.3, **kwargs) -> httpx.Response:
+    # httpx transport retries only cover connection errors; retry idempotent GETs on 429/5xx too.
+    for attempt in range(retries + 1):
+        res = HTTP.get(url, **kwargs)
+        if res.status_code not in RETRY_STATUSES or attempt == retries:
+            return res
+        time.sleep(backoff * 2 ** attempt)
+
+def _post_json(url: str, obj, headers: dict, timeout: int = 20) -> httpx.Response:
+    return HTTP.post(
+        url,
+        content=orjson.dumps(obj),
+        headers={**headers, "Content-Type": "application/json"},
+        timeout=timeout,
+    )
+
 # =========================
 # 📉 Alpha Vantage helper
 # =========================
-def get_alpha_vantage_monthly_return(symbol: str):
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_monthly_return(symbol: str) -> float:
+    # Raises on any failure so rate-limited / empty responses are not cached.
     url = (
         "https://www.alphavantage.co/query"
         f"?function=TIME_SERIES_MONTHLY_ADJUSTED&symbol={symbol}&apikey={API_KEY}"
     )
+    r = _get_with_retry(url, timeout=20)
+    r.raise_for_status()
+    data = orjson.loads(r.content)
+    ts = data.get("Monthly Adjusted Time Series") or {}
+    if not isinstance(ts, dict) or len(ts) < 2:
+        raise ValueError(f"No monthly series for {symbol}")
+    # ISO dates sort lexicographically; only the two most recent months are needed.
+    dates = heapq.nlargest(2, ts)
+    close0 = float(ts[dates[0]]["5. adjusted close"])
+    close1 = float(ts[dates[1]]["5. adjusted close"])
+    if close1 == 0:
+        raise ValueError(f"Zero close price for {symbol}")
+    return (close0 - close1) / close1
+
+def get_alpha_vantage_monthly_return(symbol: str):
     try:
-        r = requests.get(url, timeout=20)
-        if r.status_code != 200:
-            return None
-        data = r.json()
-        ts = data.get("Monthly Adjusted Time Series") or {}
-        if not isinstance(ts, dict) or len(ts) < 2:
-            return None
-        dates = sorted(ts.keys(), reverse=True)
-        close0 = float(ts[dates[0]]["5. adjusted close"])
-        close1 = float(ts[dates[1]]["5. adjusted close"])
-        if close1 == 0:
-            return None
-        return (close0 - close1) / close1
+        return _fetch_monthly_return(symbol)
     except Exception:
         return None
 
 # =========================
 # 🧾 Inputs
 # =========================
-st.sidebar.header("📊 Monthly Income")
-income = st.sidebar.number_input("Monthly income (before tax, $)", min_value=0.0, value=5000.0, step=100.0)
-tax_rate = st.sidebar.slider("Tax rate (%)", 0, 50, 20)
-
-st.sidebar.header("📌 Expenses")
-housing = st.sidebar.number_input("Housing / Rent ($)", 0.0, 5000.0, 1200.0, 50.0)
-food = st.sidebar.number_input("Food / Groceries ($)", 0.0, 5000.0, 500.0, 50.0)
-transport = st.sidebar.number_input("Transport ($)", 0.0, 5000.0, 300.0, 50.0)
-utilities = st.sidebar.number_input("Utilities ($)", 0.0, 5000.0, 200.0, 50.0)
-entertainment = st.sidebar.number_input("Entertainment ($)", 0.0, 5000.0, 200.0, 50.0)
-others = st.sidebar.number_input("Other expenses ($)", 0.0, 5000.0, 200.0, 50.0)
-
-st.sidebar.header("📈 Investments")
-stocks = st.sidebar.number_input("Stocks investment ($)", 0.0, 5000.0, 500.0, 100.0)
-bonds = st.sidebar.number_input("Bonds investment ($)", 0.0, 5000.0, 300.0, 100.0)
-real_estate = st.sidebar.number_input("Real estate ($)", 0.0, 5000.0, 0.0, 100.0)
-crypto = st.sidebar.number_input("Crypto ($)", 0.0, 5000.0, 0.0, 100.0)
-fixed_deposit = st.sidebar.number_input("Fixed deposit ($)", 0.0, 5000.0, 0.0, 100.0)
-
-months = st.sidebar.slider("Projection period (months)", 1, 60, 12)
-savings_target = st.sidebar.number_input("Savings target at end of period ($)", 0.0, 1_000_000.0, 10000.0, 500.0)
+# Widgets only trigger a rerun when the form is submitted, not on every keystroke/drag.
+with st.sidebar.form("inputs"):
+    st.header("📊 Monthly Income")
+    income = st.number_input("Monthly income (before tax, $)", min_value=0.0, value=5000.0, step=100.0)
+    tax_rate = st.slider("Tax rate (%)", 0, 50, 20)
+
+    st.header("📌 Expenses")
+    housing = st.number_input("Housing / Rent ($)", 0.0, 5000.0, 1200.0, 50.0)
+    food = st.number_input("Food / Groceries ($)", 0.0, 5000.0, 500.0, 50.0)
+    transport = st.number_input("Transport ($)", 0.0, 5000.0, 300.0, 50.0)
+    utilities = st.number_input("Utilities ($)", 0.0, 5000.0, 200.0, 50.0)
+    entertainment = st.number_input("Entertainment ($)", 0.0, 5000.0, 200.0, 50.0)
+    others = st.number_input("Other expenses ($)", 0.0, 5000.0, 200.0, 50.0)
+
+    st.header("📈 Investments")
+    stocks = st.number_input("Stocks investment ($)", 0.0, 5000.0, 500.0, 100.0)
+    bonds = st.number_input("Bonds investment ($)", 0.0, 5000.0, 300.0, 100.0)
+    real_estate = st.number_input("Real estate ($)", 0.0, 5000.0, 0.0, 100.0)
+    crypto = st.number_input("Crypto ($)", 0.0, 5000.0, 0.0, 100.0)
+    fixed_deposit = st.number_input("Fixed deposit ($)", 0.0, 5000.0, 0.0, 100.0)
+
+    months = st.slider("Projection period (months)", 1, 60, 12)
+    savings_target = st.number_input("Savings target at end of period ($)", 0.0, 1_000_000.0, 10000.0, 500.0)
+
+    use_live_returns = st.checkbox("Use live Alpha Vantage returns", value=False)
+
+    st.form_submit_button("Update projection")
 
 # =========================
 # 📈 Returns (safe defaults)
 # =========================
-stock_r = get_alpha_vantage_monthly_return("SPY") or 0.01
-bond_r  = get_alpha_vantage_monthly_return("AGG") or 0.003
+stock_r = 0.01
+bond_r  = 0.003
+if use_live_returns:
+    stock_r = get_alpha_vantage_monthly_return("SPY") or stock_r
+    bond_r  = get_alpha_vantage_monthly_return("AGG") or bond_r
 real_r  = 0.004
 crypto_r = 0.02
 fd_r     = 0.003
@@ -89,28 +144,37 @@ total_exp = housing + food + transport + utilities + entertainment + others
 total_inv = stocks + bonds + real_estate + crypto + fixed_deposit
 net_flow = after_tax_income - total_exp - total_inv
 
-bal = 0.0
-rows = []
-for m in range(1, months + 1):
-    bal += net_flow
-    stock_val = stocks * ((1 + stock_r) ** m - 1) / stock_r if stock_r else stocks * m
-    bond_val  = bonds * ((1 + bond_r)  ** m - 1) / bond_r  if bond_r else bonds * m
-    real_val  = real_estate * ((1 + real_r) ** m - 1) / real_r if real_r else real_estate * m
-    crypto_val = crypto * ((1 + crypto_r) ** m - 1) / crypto_r if crypto_r else crypto * m
-    fd_val     = fixed_deposit * ((1 + fd_r) ** m - 1) / fd_r if fd_r else fixed_deposit * m
+def project(months, net_flow, stocks, bonds, real_estate, crypto, fd, rs, rb, rr, rc, rf):
+    """Month-by-month cash balance, per-asset values and net worth as seven arrays."""
+    m = np.arange(1, months + 1, dtype=np.float64)
+    bal = np.cumsum(np.full(months, net_flow))
+
+    # Future value of a monthly contribution p at rate r: p * ((1+r)**m - 1) / r, or p * m when r == 0.
+    # (1+r)**m is built with one multiply per month via cumprod instead of pow().
+    rates = np.array([rs, rb, rr, rc, rf], dtype=np.float64)[:, None]
+    amounts = np.array([stocks, bonds, real_estate, crypto, fd], dtype=np.float64)[:, None]
+    growth = np.cumprod(np.broadcast_to(1.0 + rates, (len(rates), months)), axis=1)
+    factor = np.divide(growth - 1.0, rates, out=np.tile(m, (len(rates), 1)), where=rates != 0)
+    stock_val, bond_val, real_val, crypto_val, fd_val = amounts * factor
 
     net_worth = bal + stock_val + bond_val + real_val + crypto_val + fd_val
-    rows.append({
-        "Month": m,
-        "Balance": bal,
-        "Stocks": stock_val,
-        "Bonds": bond_val,
-        "RealEstate": real_val,
-        "Crypto": crypto_val,
-        "FixedDeposit": fd_val,
-        "NetWorth": net_worth
-    })
-df = pd.DataFrame(rows)
+    return bal, stock_val, bond_val, real_val, crypto_val, fd_val, net_worth
+
+bal, stock_val, bond_val, real_val, crypto_val, fd_val, net_worth = project(
+    months, net_flow, stocks, bonds, real_estate, crypto, fixed_deposit,
+    stock_r, bond_r, real_r, crypto_r, fd_r,
+)
+
+df = pd.DataFrame({
+    "Month": np.arange(1, months + 1),
+    "Balance": bal,
+    "Stocks": stock_val,
+    "Bonds": bond_val,
+    "RealEstate": real_val,
+    "Crypto": crypto_val,
+    "FixedDeposit": fd_val,
+    "NetWorth": net_worth
+}, copy=False)
 
 # =========================
 # 📋 Summary
@@ -126,37 +190,44 @@ colE.metric("Net Cash Flow", f"${net_flow:,.2f}/mo")
 # =========================
 # 📊 Charts
 # =========================
+EXP_LABELS = ("Housing", "Food", "Transport", "Utilities", "Entertainment", "Others")
+INV_LABELS = ("Stocks", "Bonds", "RealEstate", "Crypto", "FixedDeposit")
+
+# Bounded so every input combination from every session isn't kept for the process lifetime.
+FIG_CACHE_MAX_ENTRIES = 32
+
+@st.cache_data(show_spinner=False, max_entries=FIG_CACHE_MAX_ENTRIES)
+def build_line_fig(df: pd.DataFrame, savings_target: float) -> "go.Figure":
+    import plotly.express as px  # charts render on every run, so this only keeps plotly local to the builders
+    fig = px.line(
+        df,
+        x="Month",
+        y=["Balance", "Stocks", "Bonds", "RealEstate", "Crypto", "FixedDeposit", "NetWorth"],
+        markers=True,
+        title="Net Worth & Investments Over Time",
+    )
+    fig.add_hline(y=savings_target, line_dash="dash", line_color="red", annotation_text="Target")
+    return fig
+
+@st.cache_data(show_spinner=False, max_entries=FIG_CACHE_MAX_ENTRIES)
+def build_pie_fig(labels: tuple, values: tuple, title: str) -> "go.Figure":
+    import plotly.express as px
+    return px.pie(names=labels, values=values, title=title)
+
 st.subheader("📈 Net Worth Growth")
-fig = px.line(
-    df,
-    x="Month",
-    y=["Balance", "Stocks", "Bonds", "RealEstate", "Crypto", "FixedDeposit", "NetWorth"],
-    markers=True,
-    title="Net Worth & Investments Over Time",
-)
-fig.add_hline(y=savings_target, line_dash="dash", line_color="red", annotation_text="Target")
-st.plotly_chart(fig, use_container_width=True)
+st.plotly_chart(build_line_fig(df, savings_target), use_container_width=True)
 
 st.subheader("🧾 Expense Breakdown")
-exp_s = pd.Series({
-    "Housing": housing,
-    "Food": food,
-    "Transport": transport,
-    "Utilities": utilities,
-    "Entertainment": entertainment,
-    "Others": others
-})
-st.plotly_chart(px.pie(names=exp_s.index, values=exp_s.values, title="Expense Breakdown"), use_container_width=True)
+st.plotly_chart(
+    build_pie_fig(EXP_LABELS, (housing, food, transport, utilities, entertainment, others), "Expense Breakdown"),
+    use_container_width=True,
+)
 
 st.subheader("💼 Investment Breakdown")
-inv_s = pd.Series({
-    "Stocks": stocks,
-    "Bonds": bonds,
-    "RealEstate": real_estate,
-    "Crypto": crypto,
-    "FixedDeposit": fixed_deposit
-})
-st.plotly_chart(px.pie(names=inv_s.index, values=inv_s.values, title="Investment Breakdown"), use_container_width=True)
+st.plotly_chart(
+    build_pie_fig(INV_LABELS, (stocks, bonds, real_estate, crypto, fixed_deposit), "Investment Breakdown"),
+    use_container_width=True,
+)
 
 # =========================
 # 🤖 AI Suggestions
@@ -164,7 +235,9 @@ st.plotly_chart(px.pie(names=inv_s.index, values=inv_s.values, title="Investment
 st.subheader("🤖 AI Suggestions")
 col1, col2 = st.columns(2)
 
-prompt = f"""
+def build_prompt(income, tax_rate, after_tax_income, total_exp, total_inv, net_flow,
+                 months, savings_target, projected_nw) -> str:
+    return f"""
 You are a budgeting coach. Use concise bullet points.
 
 Gross income: ${income}
@@ -174,60 +247,248 @@ Expenses: ${total_exp}
 Investments: ${total_inv}
 Net cash flow: ${net_flow}/mo
 Savings target after {months} months: ${savings_target}
-Projected net worth: ${df['NetWorth'].iloc[-1]}
+Projected net worth: ${projected_nw}
 
 Advise: (1) expense cuts, (2) investment allocation, (3) reaching savings target.
 """
 
-if col1.button("Generate OpenAI Suggestion"):
-    with st.spinner("OpenAI generating..."):
+OPENAI_MODEL = "gpt-4o-mini"
+DEEPSEEK_MODEL = "deepseek/deepseek-r1:free"
+LLM_CACHE_TTL = 86400  # seconds
+LLM_CACHE_MAX_ENTRIES = 256
+
+async def openai_suggestion(prompt: str, placeholder, http: httpx.AsyncClient):
+    # Imported lazily: openai pulls in pydantic and friends.
+    from openai import AsyncOpenAI
+
+    text, finish_reason = "", None
+    aclient = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http)
+    stream = await aclient.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices:
+            text += chunk.choices[0].delta.content or ""
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            placeholder.markdown(text)
+    if not text:
+        raise RuntimeError("empty completion")
+    return text, finish_reason is not None
+
+async def deepseek_suggestion(prompt: str, placeholder, http: httpx.AsyncClient):
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": DEEPSEEK_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+    }
+    text, finished = "", False
+    async with http.stream("POST", "https://openrouter.ai/api/v1/chat/completions", headers=headers, content=orjson.dumps(payload)) as res:
+        res.raise_for_status()
+        # Server-sent events; lines starting with ":" are keep-alive comments.
+        async for line in res.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = line[len("data: "):]
+            if data == "[DONE]":
+                finished = True
+                break
+            event = orjson.loads(data)
+            choices = event.get("choices") or [{}]
+            # Mid-stream failures arrive as a normal event carrying an error object.
+            if event.get("error") or choices[0].get("finish_reason") == "error":
+                error = event.get("error") or {}
+                raise RuntimeError(f"stream failed: {error.get('message', error) or 'finish_reason=error'}")
+            text += choices[0].get("delta", {}).get("content") or ""
+            finished = finished or choices[0].get("finish_reason") is not None
+            placeholder.markdown(text)
+    if not text:
+        raise RuntimeError("empty completion")
+    return text, finished
+
+# Each provider streams into `placeholder` and returns (text, finished), where `finished`
+# is False if the stream was cut off before a finish_reason / [DONE] was seen.
+SUGGESTION_PROVIDERS = {
+    "OpenAI": (openai_suggestion, OPENAI_MODEL),
+    "OpenRouter": (deepseek_suggestion, DEEPSEEK_MODEL),
+}
+
+@st.cache_resource(show_spinner=False)
+def get_llm_cache():
+    # Exact-match completion cache shared by all sessions: {key: (timestamp, text)},
+    # oldest first. The lock guards it against concurrent reruns in other sessions.
+    return threading.Lock(), {}
+
+def store_llm_completion(key: str, text: str):
+    lock, cache = get_llm_cache()
+    now = time.time()
+    with lock:
+        cache.pop(key, None)
+        cache[key] = (now, text)
+        for k in [k for k, (ts, _) in cache.items() if now - ts >= LLM_CACHE_TTL]:
+            del cache[k]
+        while len(cache) > LLM_CACHE_MAX_ENTRIES:
+            del cache[next(iter(cache))]
+
+def llm_cache_key(provider: str, model: str, prompt: str) -> str:
+    return hashlib.blake2b(f"{provider}\0{model}\0{prompt}".encode(), digest_size=16).hexdigest()
+
+def run_suggestions(providers, prompt: str, target_cols: dict) -> dict:
+    """Stream the given providers concurrently into their columns; failures are returned as exceptions.
+
+    Completions for an identical (provider, model, prompt) are served from the cache.
+    """
+    lock, cache = get_llm_cache()
+    now = time.time()
+    results, pending = {}, []
+    for name in providers:
+        key = llm_cache_key(name, SUGGESTION_PROVIDERS[name][1], prompt)
+        with lock:
+            hit = cache.get(key)
+        if hit and now - hit[0] < LLM_CACHE_TTL:
+            target_cols[name].markdown(hit[1])
+            results[name] = hit[1]
+        else:
+            pending.append(name)
+    if not pending:
+        return results
+
+    placeholders = {name: target_cols[name].empty() for name in pending}
+
+    async def capture(coro):
+        # Provider failures become per-column errors. Anything that is not an Exception
+        # (Streamlit's rerun/stop signals) escapes gather, and asyncio.run cancels the
+        # other stream instead of letting it run to completion first.
         try:
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-            )
-            out = resp.choices[0].message.content
-            st.write(out)
+            return await coro
         except Exception as e:
-            st.error(f"OpenAI error: {e}")
+            return e
+
+    async def run_all():
+        # One HTTP/2 client per run because its pool is bound to this event loop. OpenAI and
+        # OpenRouter are different origins, so each gets its own connection; HTTP/2 would only
+        # multiplex extra requests to the same host (e.g. fanning out to several models).
+        async with httpx.AsyncClient(http2=True, timeout=30) as http:
+            return await asyncio.gather(
+                *(capture(SUGGESTION_PROVIDERS[name][0](prompt, placeholders[name], http)) for name in pending)
+            )
+    for name, out in zip(pending, asyncio.run(run_all())):
+        # Streamlit's RerunException / StopException derive from BaseException; let them
+        # propagate so a rerun requested mid-stream still happens.
+        if isinstance(out, BaseException) and not isinstance(out, Exception):
+            raise out
+        if isinstance(out, Exception):
+            results[name] = out
+            continue
+        text, finished = out
+        # Only completions that ended cleanly are shared; a cut-off stream is shown but not cached.
+        if finished:
+            store_llm_completion(llm_cache_key(name, SUGGESTION_PROVIDERS[name][1], prompt), text)
+        results[name] = text
+    return results
+
+def show_errors(results: dict, target_cols: dict):
+    for name, out in results.items():
+        if isinstance(out, Exception):
+            target_cols[name].error(f"{name} error: {out}")
+
+output_cols = {"OpenAI": col1, "OpenRouter": col2}
+gen_openai = col1.button("Generate OpenAI Suggestion")
+gen_deepseek = col2.button("Generate DeepSeek Suggestion")
+gen_both = st.button("Generate Both Suggestions")
+
+# Only format the prompt when a suggestion is actually requested.
+if gen_both or gen_openai or gen_deepseek:
+    prompt = build_prompt(
+        income, tax_rate, after_tax_income, total_exp, total_inv, net_flow,
+        months, savings_target, float(net_worth[-1]),
+    )
 
-if col2.button("Generate DeepSeek Suggestion"):
+if gen_both:
+    with st.spinner("OpenAI + DeepSeek generating..."):
+        show_errors(run_suggestions(["OpenAI", "OpenRouter"], prompt, output_cols), output_cols)
+elif gen_openai:
+    with st.spinner("OpenAI generating..."):
+        show_errors(run_suggestions(["OpenAI"], prompt, output_cols), output_cols)
+elif gen_deepseek:
     with st.spinner("DeepSeek generating..."):
-        try:
-            headers = {
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "model": "deepseek/deepseek-r1:free",
-                "messages": [{"role": "user", "content": prompt}]
-            }
-            res = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload, timeout=30)
-            res.raise_for_status()
-            out = res.json()["choices"][0]["message"]["content"]
-            st.write(out)
-        except Exception as e:
-            st.error(f"OpenRouter error: {e}")
+        show_errors(run_suggestions(["OpenRouter"], prompt, output_cols), output_cols)
 
 # =========================
 # 💬 Botpress Text Chat
 # =========================
 st.subheader("🤖 Ask Your Financial Assistant (Botpress)")
 
-# Safely initialize conversation
+BOTPRESS_URL = "https://chat.botpress.cloud/v1/chat/conversations"
+BOTPRESS_HEADERS = {
+    "Authorization": f"Bearer {BOTPRESS_TOKEN}",
+    "X-Bot-Id": bot_id,
+}
+
+def create_botpress_conversation() -> str:
+    init = HTTP.post(BOTPRESS_URL, headers=BOTPRESS_HEADERS, timeout=20)
+    init.raise_for_status()
+    return orjson.loads(init.content).get("id")
+
+def new_assistant_replies(messages: list, since_id) -> list:
+    """Assistant text replies that arrived after the message with id `since_id`.
+
+    `messages` must be oldest-first. If `since_id` is set but not in `messages` (e.g. it
+    is on another page), nothing is reported as new rather than replaying old replies.
+    """
+    ids = [m.get("id") for m in messages]
+    if since_id is None:
+        start = 0
+    elif since_id in ids:
+        start = ids.index(since_id) + 1
+    else:
+        return []
+    return [
+        m.get("payload", {}).get("text", "")
+        for m in messages[start:]
+        if m.get("role") == "assistant" and m.get("type") == "text"
+    ]
+
+BOTPRESS_POLL_DELAYS = (0.2, 0.4, 0.8, 1.6, 3.2)  # seconds, ~6 s total
+
+def poll_botpress_reply(messages_url: str, since_id):
+    """Poll with exponential backoff until the bot has replied after `since_id`.
+
+    Returns (replies, last_message_id); replies is empty if the bot did not answer in time.
+    """
+    for delay in BOTPRESS_POLL_DELAYS:
+        time.sleep(delay)
+        headers = dict(BOTPRESS_HEADERS)
+        if st.session_state.get("botpress_etag"):
+            # Conditional GET: an unchanged history comes back as an empty 304.
+            headers["If-None-Match"] = st.session_state.botpress_etag
+        reply_res = _get_with_retry(messages_url, headers=headers, timeout=20)
+        if reply_res.status_code == 304:
+            continue
+        reply_res.raise_for_status()
+        st.session_state.botpress_etag = reply_res.headers.get("ETag")
+        # Order oldest-first by ISO createdAt (lexicographic == chronological); the sort
+        # is stable, so messages without a timestamp keep the server's order.
+        messages = sorted(
+            orjson.loads(reply_res.content).get("messages", []),
+            key=lambda m: m.get("createdAt") or "",
+        )
+        replies = [r for r in new_assistant_replies(messages, since_id) if r]
+        if replies:
+            return replies, messages[-1].get("id")
+    return [], since_id
+
+# Safely initialize conversation (once per browser session; conversations are per user)
 if "conversation_id" not in st.session_state:
     try:
-        init = requests.post(
-            "https://chat.botpress.cloud/v1/chat/conversations",
-            headers={
-                "Authorization": f"Bearer {BOTPRESS_TOKEN}",
-                "X-Bot-Id": bot_id,
-            },
-            timeout=20
-        )
-        init.raise_for_status()
-        st.session_state.conversation_id = init.json().get("id")
+        st.session_state.conversation_id = create_botpress_conversation()
+        st.session_state.last_message_id = None
     except Exception as e:
         st.error(f"❌ Failed to create Botpress conversation: {e}")
         st.stop()
@@ -241,6 +502,7 @@ if st.button("Send to Botpress"):
     elif "conversation_id" not in st.session_state:
         st.error("❌ No active conversation. Please reload the app.")
     else:
+        messages_url = f"{BOTPRESS_URL}/{st.session_state.conversation_id}/messages"
         payload = {
             "type": "text",
             "role": "user",
@@ -248,37 +510,23 @@ if st.button("Send to Botpress"):
         }
 
         try:
-            res = requests.post(
-                f"https://chat.botpress.cloud/v1/chat/conversations/{st.session_state.conversation_id}/messages",
-                json=payload,
-                headers={
-                    "Authorization": f"Bearer {BOTPRESS_TOKEN}",
-                    "X-Bot-Id": bot_id,
-                    "Content-Type": "application/json"
-                },
-                timeout=20
-            )
+            res = _post_json(messages_url, payload, BOTPRESS_HEADERS)
             res.raise_for_status()
+            sent = orjson.loads(res.content).get("message") or {}
+            if sent.get("id"):
+                st.session_state.last_message_id = sent["id"]
             st.success("✅ Message sent to Botpress!")
         except Exception as e:
             st.error(f"❌ Failed to send message: {e}")
             st.stop()
 
-        # Fetch Botpress reply
+        # Wait for the Botpress reply (the bot runtime answers asynchronously)
         try:
-            reply_res = requests.get(
-                f"https://chat.botpress.cloud/v1/chat/conversations/{st.session_state.conversation_id}/messages",
-                headers={
-                    "Authorization": f"Bearer {BOTPRESS_TOKEN}",
-                    "X-Bot-Id": bot_id,
-                },
-                timeout=20
-            )
-            reply_res.raise_for_status()
-            data = reply_res.json()
-            messages = data.get("messages", [])
-            replies = [m.get("payload", {}).get("text", "") for m in messages if m.get("role") == "assistant" and m.get("type") == "text"]
-            if replies and replies[-1]:
+            with st.spinner("Waiting for Botpress..."):
+                replies, st.session_state.last_message_id = poll_botpress_reply(
+                    messages_url, st.session_state.get("last_message_id")
+                )
+            if replies:
                 st.info(f"🤖 Botpress: {replies[-1]}")
             else:
                 st.warning("⚠️ Botpress sent no reply.")